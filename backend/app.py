@@ -1,35 +1,25 @@
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+import time
+_process_start = time.perf_counter()
+
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, JSONResponse
 import os
-import gdown
-import zipfile
-from tensorflow import keras
+import struct
+import threading
 from PIL import Image
 import numpy as np
 import io
+import msgpack
+from collections import OrderedDict
+from model.preprocessing import (to_model_input, tta_views, aggregate_tta, is_borderline, dhash,
+                                 color_thumbnail, thumbnails_match, IMG_SIZE, TTA_VIEWS)
+from model.embedding_index import EmbeddingIndex, embedding_model
+from model.serving import (class_names, custom_class_map, CONFIDENCE_THRESHOLD, MODEL_PATH,
+                           EMBEDDING_INDEX_PATH, download_artifacts)
 
-# Create folders if needed
-os.makedirs("models", exist_ok=True)
-os.makedirs("data", exist_ok=True)
-os.makedirs("backend/model", exist_ok=True)
-
-# Download files if they don’t exist
-if not os.path.exists("models/model1.keras"):
-    gdown.download("https://drive.google.com/uc?id=1EEVdZIccpaoae4YXqufto06sVf7kgdid", "models/model1.keras", quiet=False)
-
-if not os.path.exists("models/model2.h5"):
-    gdown.download("https://drive.google.com/uc?id=13adspLBtZpSoABp4VkWjBITwWvelft6x", "models/model2.h5", quiet=False)
-
-if not os.path.exists("data/dataset.zip"):
-    gdown.download("https://drive.google.com/uc?id=1Ifv5aCXVo0TDHK8K8XsrF77dk7rr83p4", "data/dataset.zip", quiet=False)
-
-if not os.path.exists("backend/model/waste_model_improved.h5"):
-    gdown.download("https://drive.google.com/uc?id=13adspLBtZpSoABp4VkWjBITwWvelft6x", "backend/model/waste_model_improved.h5", quiet=False)
-
-# Extract dataset if not already extracted
-if os.path.exists("data/dataset.zip") and not os.path.exists("data/dataset"):
-    with zipfile.ZipFile("data/dataset.zip", 'r') as zip_ref:
-        zip_ref.extractall("data/")
+# TensorFlow, gdown and zipfile are imported lazily in the startup thread so the process
+# can answer liveness checks while the model is still loading.
 
 app = FastAPI()
 
@@ -42,90 +32,262 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-@app.on_event('startup')
+model = embedder = embedding_index = None
+model_ready = threading.Event()
+# Seconds spent in each startup phase, reported by /readyz
+startup_profile = {"imports": time.perf_counter() - _process_start}
+startup_error = None
+
 def load_model():
-    global model
-    model_path = 'backend/model/waste_model_improved.h5'
-    if not os.path.exists(model_path):
-        raise RuntimeError(f"Model file not found at {model_path}")
+    """
+    Download and load the model, build the embedder, load the optional index and warm up.
+    """
+    global model, embedder, embedding_index, startup_error
+
+    def phase(name, start):
+        startup_profile[name] = round(time.perf_counter() - start, 3)
+        return time.perf_counter()
+
     try:
-        model = keras.models.load_model(model_path)
+        t = time.perf_counter()
+        download_artifacts()
+        t = phase("download", t)
+
+        from tensorflow import keras
+        t = phase("import_tensorflow", t)
+
+        model_path = MODEL_PATH
+        if not os.path.exists(model_path):
+            raise RuntimeError(f"Model file not found at {model_path}")
+        try:
+            model = keras.models.load_model(model_path)
+        except Exception as e:
+            raise RuntimeError(f"Failed to load model: {e}")
+        t = phase("load_model", t)
+
+        # Embeddings are optional; without an embedder only embed=true is unavailable
+        try:
+            embedder = embedding_model(model)
+        except Exception as e:
+            print(f"⚠️  Embeddings disabled, failed to build the embedder: {e}")
+
+        # The nearest-neighbour index is optional; build it with model/embedding_index.py
+        if embedder is not None and os.path.exists(EMBEDDING_INDEX_PATH):
+            try:
+                embedding_index = EmbeddingIndex.load(EMBEDDING_INDEX_PATH)
+            except Exception as e:
+                print(f"⚠️  Failed to load embedding index: {e}")
+        elif embedder is not None:
+            print(f"ℹ️  No embedding index at {EMBEDDING_INDEX_PATH}, embed=true returns no neighbours")
+        t = phase("load_embedding_index", t)
+
+        # A dummy inference builds the predict functions before the first real request
+        dummy = np.zeros((1, *IMG_SIZE, 3), dtype=np.float32)
+        model.predict(dummy, verbose=0)
+        if embedder is not None:
+            embedder.predict(dummy, verbose=0)
+        phase("warmup", t)
     except Exception as e:
-        raise RuntimeError(f"Failed to load model: {e}")
-
-class_names = ['biodegradable', 'cardboard', 'glass', 'metal', 'organic', 'paper', 'plastic', 'trash']
-
-custom_class_map = {
-    'cardboard': {
-        "tags": ['♻️ Recyclable', '🌱 Biodegradable'],
-        "description": "Cardboard is biodegradable and recyclable if clean and dry."
-    },
-    'glass': {
-        "tags": ['♻️ Recyclable'],
-        "description": "Glass is recyclable, but should be clean and unbroken."
-    },
-    'metal': {
-        "tags": ['♻️ Recyclable'],
-        "description": "Metal (like cans or foil) is recyclable when free from food or contaminants."
-    },
-    'paper': {
-        "tags": ['♻️ Recyclable', '🌱 Biodegradable'],
-        "description": "Paper is biodegradable and recyclable if not soiled."
-    },
-    'plastic': {
-        "tags": ['♻️ Recyclable', '🚯 Non-Biodegradable'],
-        "description": "Plastics are non-biodegradable. Only some types are recyclable."
-    },
-    'trash': {
-        "tags": ['🚯 Non-Recyclable'],
-        "description": "General waste (dirty, mixed, or non-recyclable items). Should go to landfill."
-    },
-    'biodegradable': {
-        "tags": ['🌱 Biodegradable', '🍃 Eco-Friendly'],
-        "description": "Biodegradable materials naturally break down and return to the earth safely."
-    },
-    'organic': {
-        "tags": ['🍎 Organic Waste', '🌱 Biodegradable'],
-        "description": "Organic waste includes food scraps and natural matter suitable for composting."
-    }
-}
+        startup_error = str(e)
+        print(f"❌ Startup failed: {e}")
+        return
+
+    startup_profile["total"] = round(time.perf_counter() - _process_start, 3)
+    model_ready.set()
+    print(f"✅ Model ready. Startup profile (s): {startup_profile}")
+
+@app.on_event('startup')
+def start_model_loading():
+    threading.Thread(target=load_model, name="model-loader", daemon=True).start()
+
+@app.get("/healthz")
+def healthz():
+    """
+    Liveness: 200 while the model is loading or loaded, 503 once startup has failed so the
+    orchestrator restarts the process instead of leaving it unready forever.
+    """
+    if startup_error:
+        return JSONResponse(status_code=503, content={"status": "failed", "error": startup_error})
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readyz():
+    """
+    Readiness: 200 once the model is loaded and warmed up, 503 before that or if startup failed.
+    """
+    body = {"ready": model_ready.is_set(), "startup_profile": startup_profile}
+    if startup_error:
+        body["error"] = startup_error
+    if not model_ready.is_set():
+        return JSONResponse(status_code=503, content=body)
+    return body
+
+UNCERTAIN_DESCRIPTION = "The model is not confident in its prediction. The uploaded image may not match any known category."
+
+# Compact binary layout for ?format=float32:
+#   header  <HhfI  n_classes (uint16), pred_index (int16, -1 if uncertain),
+#                  confidence (float32), reserved (uint32, always 0)
+#   body    n_classes little-endian float32 probabilities in class_names order
+FLOAT32_HEADER = struct.Struct('<HhfI')
+RESPONSE_FORMATS = ('json', 'msgpack', 'float32')
+
+# Test-time augmentation: 'auto' re-runs borderline images (single-view confidence within
+# TTA_MARGIN of CONFIDENCE_THRESHOLD) as one batch of TTA_K views and averages the probabilities
+TTA_MODES = ('off', 'auto', 'always')
+TTA_K = int(os.environ.get('TTA_K', 4))
+TTA_MARGIN = float(os.environ.get('TTA_MARGIN', 0.15))
+if not 1 <= TTA_K <= len(TTA_VIEWS):
+    raise RuntimeError(f"TTA_K must be between 1 and {len(TTA_VIEWS)}, got {TTA_K}")
+
+# Opt-in cache of recent uploads keyed by (dhash, tta mode). A hit is only reused when a
+# colour thumbnail stored with the entry also matches, so near-identical images skip
+# inference but differently coloured items with the same shape do not share a result.
+DEDUP_CACHE_SIZE = int(os.environ.get('DEDUP_CACHE_SIZE', 0))
+EMBED_NEIGHBOURS = int(os.environ.get('EMBED_NEIGHBOURS', 5))
+recent_predictions = OrderedDict()
+
+def classify_image(image, tta='off', embed=False):
+    """
+    Return (probabilities, embedding) for an RGB PIL image, optionally with test-time augmentation.
+
+    The embedding is the pooled backbone output and is only computed when embed is True.
+    """
+    key = thumb = None
+    if DEDUP_CACHE_SIZE > 0:
+        key, thumb = (dhash(image), tta), color_thumbnail(image)
+        cached = recent_predictions.get(key)
+        if (cached is not None and (cached[1] is not None or not embed)
+                and thumbnails_match(cached[2], thumb)):
+            recent_predictions.move_to_end(key)
+            return cached[0], cached[1]
+
+    embedding = None
+    if tta == 'always' and TTA_K > 1 and not embed:
+        probabilities = aggregate_tta(model.predict(tta_views(image, TTA_K)))
+    else:
+        img_array = np.expand_dims(to_model_input(image), axis=0)
+        if embed:
+            features, preds = embedder.predict(img_array)
+            embedding, probabilities = features[0], preds[0]
+        else:
+            probabilities = model.predict(img_array)[0]
+        needs_tta = tta == 'always' or (tta == 'auto' and is_borderline(probabilities.max(), CONFIDENCE_THRESHOLD, TTA_MARGIN))
+        if needs_tta and TTA_K > 1:
+            # Only the extra views go through the model; the plain view is reused
+            extra = model.predict(tta_views(image, TTA_K, skip_identity=True))
+            probabilities = aggregate_tta(np.vstack([probabilities[np.newaxis], extra]))
+
+    if key:
+        recent_predictions[key] = (probabilities, embedding, thumb)
+        if len(recent_predictions) > DEDUP_CACHE_SIZE:
+            recent_predictions.popitem(last=False)
+    return probabilities, embedding
+
+def embedding_details(embedding):
+    """
+    Return the response fields for an embedding: the vector and its closest labelled dataset images.
+    """
+    details = {"embedding": np.round(embedding.astype(np.float64), 4).tolist()}
+    if embedding_index is not None:
+        details["neighbours"] = [
+            {"path": path, "label": label, "similarity": round(similarity, 4)}
+            for path, label, similarity in embedding_index.search(embedding, k=EMBED_NEIGHBOURS)
+        ]
+    return details
+
+def build_prediction(probabilities):
+    """
+    Build the JSON-compatible prediction dict from one row of model probabilities.
+    """
+    probabilities = np.asarray(probabilities, dtype=np.float64)
+    pred_index = int(probabilities.argmax())
+    pred_confidence = float(probabilities[pred_index])
+    # One vectorized round + tolist instead of a per-class round(float(...))
+    all_probabilities = dict(zip(class_names, np.round(probabilities, 4).tolist()))
+
+    if pred_confidence < CONFIDENCE_THRESHOLD:
+        prediction = {
+            "label": "uncertain",
+            "confidence": round(pred_confidence, 4),
+            "tags": [],
+            "description": UNCERTAIN_DESCRIPTION
+        }
+    else:
+        pred_class = class_names[pred_index]
+        class_info = custom_class_map.get(pred_class, {"tags": [], "description": ""})
+        prediction = {
+            "label": pred_class,
+            "confidence": round(pred_confidence, 4),
+            "tags": class_info["tags"],
+            "description": class_info["description"]
+        }
+
+    return {"prediction": prediction, "all_probabilities": all_probabilities}
+
+def encode_float32(probabilities):
+    """
+    Pack one row of probabilities as FLOAT32_HEADER followed by raw float32 values.
+    """
+    probabilities = np.asarray(probabilities, dtype='<f4')
+    pred_index = int(probabilities.argmax())
+    pred_confidence = float(probabilities[pred_index])
+    if pred_confidence < CONFIDENCE_THRESHOLD:
+        pred_index = -1
+    header = FLOAT32_HEADER.pack(len(probabilities), pred_index, pred_confidence, 0)
+    return header + probabilities.tobytes()
+
+def render_prediction(probabilities, response_format='json', extra=None):
+    """
+    Render probabilities in the requested response format.
+
+    extra fields are merged into the json and msgpack bodies; the float32 format ignores them.
+    """
+    if response_format == 'json':
+        return {**build_prediction(probabilities), **(extra or {})}
+    if response_format == 'msgpack':
+        return Response(
+            content=msgpack.packb({**build_prediction(probabilities), **(extra or {})}, use_bin_type=True),
+            media_type="application/x-msgpack"
+        )
+    if response_format == 'float32':
+        return Response(
+            content=encode_float32(probabilities),
+            media_type="application/octet-stream",
+            headers={"X-Class-Names": ",".join(class_names)}
+        )
+    raise HTTPException(
+        status_code=400,
+        detail=f"Unknown format '{response_format}'. Expected one of: {', '.join(RESPONSE_FORMATS)}"
+    )
 
 @app.post("/predict")
-async def predict(file: UploadFile = File(...)):
+async def predict(
+    file: UploadFile = File(...),
+    response_format: str = Query('json', alias='format'),
+    tta: str = Query('off'),
+    embed: bool = Query(False)
+):
+    if response_format not in RESPONSE_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown format '{response_format}'. Expected one of: {', '.join(RESPONSE_FORMATS)}"
+        )
+    if tta not in TTA_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown tta mode '{tta}'. Expected one of: {', '.join(TTA_MODES)}"
+        )
+    if not model_ready.is_set():
+        raise HTTPException(status_code=503, detail="Model is not loaded yet")
+    if embed and embedder is None:
+        raise HTTPException(status_code=503, detail="Embeddings are not available for this model")
     try:
         contents = await file.read()
         image = Image.open(io.BytesIO(contents)).convert('RGB')
-        image = image.resize((224, 224))
-        img_array = np.array(image) / 255.0
-        img_array = np.expand_dims(img_array, axis=0)
-        preds = model.predict(img_array)
-        probabilities = preds[0].tolist()
-        pred_index = int(np.argmax(preds[0]))
-        pred_class = class_names[pred_index]
-        pred_confidence = float(probabilities[pred_index])
-        class_info = custom_class_map.get(pred_class, {"tags": [], "description": ""})
-
-        CONFIDENCE_THRESHOLD = 0.7  # Set your threshold here
-
-        if pred_confidence < CONFIDENCE_THRESHOLD:
-            return {
-                "prediction": {
-                    "label": "uncertain",
-                    "confidence": round(pred_confidence, 4),
-                    "tags": [],
-                    "description": "The model is not confident in its prediction. The uploaded image may not match any known category."
-                },
-                "all_probabilities": {class_names[i]: round(float(probabilities[i]), 4) for i in range(len(class_names))}
-            }
-
-        return {
-            "prediction": {
-                "label": pred_class,
-                "confidence": round(pred_confidence, 4),
-                "tags": class_info["tags"],
-                "description": class_info["description"]
-            },
-            "all_probabilities": {class_names[i]: round(float(probabilities[i]), 4) for i in range(len(class_names))}
-        }
+        probabilities, embedding = classify_image(image, tta, embed)
+        extra = embedding_details(embedding) if embed else None
+        return render_prediction(probabilities, response_format, extra)
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
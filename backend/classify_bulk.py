@@ -0,0 +1,231 @@
+import os
+import io
+import csv
+import time
+import tarfile
+import zipfile
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image
+from tensorflow import keras
+from model.serving import class_names, custom_class_map, CONFIDENCE_THRESHOLD, MODEL_PATH, download_artifacts
+from model.preprocessing import to_model_input
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+def iter_images(source):
+    """
+    Yield (key, loader) pairs for every image in a directory, .zip or .tar(.gz) archive.
+
+    loader() returns the raw bytes (archives) or the file path (directories); both are
+    accepted by PIL. Archive members are read in the calling thread, so only decoding is
+    done in the worker pool.
+    """
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for f in sorted(files):
+                if f.lower().endswith(IMAGE_EXTENSIONS):
+                    path = os.path.join(root, f)
+                    yield os.path.relpath(path, source), (lambda path=path: path)
+    elif zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as zf:
+            for name in zf.namelist():
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield name, (lambda name=name: zf.read(name))
+    elif tarfile.is_tarfile(source):
+        # Streaming mode: members are read in order without seeking
+        with tarfile.open(source, 'r|*') as tf:
+            for member in tf:
+                if member.isfile() and member.name.lower().endswith(IMAGE_EXTENSIONS):
+                    data = tf.extractfile(member).read()
+                    yield member.name, (lambda data=data: data)
+    else:
+        raise ValueError(f"{source} is not a directory, zip or tar archive")
+
+def decode(item):
+    """
+    Decode one image into model input, returning (key, array or None, error message).
+    """
+    key, data = item
+    try:
+        src = io.BytesIO(data) if isinstance(data, bytes) else data
+        with Image.open(src) as image:
+            return key, to_model_input(image.convert('RGB')), ''
+    except Exception as e:
+        return key, None, str(e)
+
+class CsvResultWriter:
+    """
+    Append result rows to a CSV file, flushing after every batch.
+    """
+    def __init__(self, path, columns):
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        self.f = open(path, 'a', newline='')
+        self.writer = csv.writer(self.f)
+        if not exists:
+            self.writer.writerow(columns)
+
+    @staticmethod
+    def done_keys(path):
+        if not os.path.exists(path):
+            return set()
+        with open(path, newline='') as f:
+            return {row['path'] for row in csv.DictReader(f)}
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+class ParquetResultWriter:
+    """
+    Write result rows as numbered part files in a Parquet dataset directory, one per flush.
+    """
+    def __init__(self, path, columns, rows_per_part=10000):
+        import pyarrow
+        import pyarrow.parquet
+        self.pa, self.pq = pyarrow, pyarrow.parquet
+        self.path, self.columns, self.rows_per_part = path, columns, rows_per_part
+        os.makedirs(path, exist_ok=True)
+        self.part = len([f for f in os.listdir(path) if f.endswith('.parquet')])
+        self.pending = []
+
+    @staticmethod
+    def done_keys(path):
+        if not os.path.isdir(path):
+            return set()
+        import pyarrow.parquet as pq
+        keys = set()
+        for f in sorted(os.listdir(path)):
+            if f.endswith('.parquet'):
+                keys.update(pq.read_table(os.path.join(path, f), columns=['path']).column('path').to_pylist())
+        return keys
+
+    def write(self, rows):
+        self.pending.extend(rows)
+        if len(self.pending) >= self.rows_per_part:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        table = self.pa.table({col: [row[i] for row in self.pending] for i, col in enumerate(self.columns)})
+        tmp_path = os.path.join(self.path, f'.part-{self.part:05d}.tmp')
+        self.pq.write_table(table, tmp_path)
+        os.replace(tmp_path, os.path.join(self.path, f'part-{self.part:05d}.parquet'))
+        self.part += 1
+        self.pending = []
+
+    def close(self):
+        self.flush()
+
+def result_rows(keys, probabilities):
+    """
+    Turn a batch of probabilities into output rows using the same labels and threshold as /predict.
+    """
+    pred_index = probabilities.argmax(axis=1)
+    confidence = probabilities[np.arange(len(keys)), pred_index]
+    names = np.asarray(class_names)[pred_index]
+    labels = np.where(confidence < CONFIDENCE_THRESHOLD, 'uncertain', names)
+    rounded = np.round(probabilities.astype(np.float64), 4).tolist()
+    rows = []
+    for key, label, conf, probs in zip(keys, labels.tolist(), confidence.tolist(), rounded):
+        tags = '; '.join(custom_class_map.get(label, {"tags": []})["tags"])
+        rows.append([key, label, round(conf, 4), tags, ''] + probs)
+    return rows
+
+def error_rows(errors):
+    return [[key, 'error', None, '', message] + [None] * len(class_names) for key, message in errors]
+
+def classify_bulk(source, output, output_format='csv', model_path=MODEL_PATH,
+                  batch_size=64, workers=8, prefetch=4, report_every=1000):
+    """
+    Classify every image under source and append results to output, skipping images already there.
+    """
+    columns = ['path', 'label', 'confidence', 'tags', 'error'] + [f'p_{name}' for name in class_names]
+    writer_cls = ParquetResultWriter if output_format == 'parquet' else CsvResultWriter
+
+    if output_format == 'parquet':
+        try:
+            import pyarrow
+        except ImportError:
+            print("❌ pyarrow is not installed. Install it or use --format csv.")
+            return
+
+    done = writer_cls.done_keys(output)
+    if done:
+        print(f"⏩ Resuming: {len(done)} images already classified in {output}")
+
+    try:
+        if model_path == MODEL_PATH:
+            download_artifacts(include_training_data=False)
+        model = keras.models.load_model(model_path)
+        print(f"✅ Model loaded from {model_path}")
+    except Exception as e:
+        print(f"❌ Error loading model: {e}")
+        return
+
+    writer = writer_cls(output, columns)
+    pending = (item for item in iter_images(source) if item[0] not in done)
+
+    def next_batch():
+        batch = []
+        for key, loader in pending:
+            batch.append((key, loader()))
+            if len(batch) == batch_size:
+                break
+        return batch
+
+    processed = 0
+    start = time.time()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # Keep `prefetch` batches decoding while the model runs on the current one
+            queue = deque()
+            while True:
+                while len(queue) < prefetch:
+                    batch = next_batch()
+                    if not batch:
+                        break
+                    queue.append(pool.map(decode, batch))
+                if not queue:
+                    break
+
+                decoded = list(queue.popleft())
+                ok = [(key, arr) for key, arr, err in decoded if arr is not None]
+                errors = [(key, err) for key, arr, err in decoded if arr is None]
+
+                rows = error_rows(errors)
+                if ok:
+                    probabilities = model.predict_on_batch(np.stack([arr for _, arr in ok]))
+                    rows = result_rows([key for key, _ in ok], np.asarray(probabilities)) + rows
+                writer.write(rows)
+
+                processed += len(decoded)
+                if processed // report_every != (processed - len(decoded)) // report_every:
+                    print(f"Processed {processed} images - {processed / (time.time() - start):.1f} images/sec")
+    finally:
+        writer.close()
+
+    elapsed = time.time() - start
+    rate = processed / elapsed if elapsed > 0 else 0.0
+    print(f"✅ Classified {processed} images in {elapsed:.1f}s ({rate:.1f} images/sec)")
+    print(f"💾 Results written to {output}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Classify a directory or archive of waste images offline.")
+    parser.add_argument('source', help="Image directory, .zip or .tar(.gz) archive")
+    parser.add_argument('output', help="Output .csv file, or directory for --format parquet")
+    parser.add_argument('--format', dest='output_format', choices=['csv', 'parquet'], default='csv')
+    parser.add_argument('--model', dest='model_path', default=MODEL_PATH)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--workers', type=int, default=8, help="Image decode threads")
+    parser.add_argument('--prefetch', type=int, default=4, help="Batches decoded ahead of inference")
+    args = parser.parse_args()
+    classify_bulk(args.source, args.output, args.output_format, args.model_path,
+                  args.batch_size, args.workers, args.prefetch)
@@ -1,7 +1,8 @@
 import os
 import shutil
-from tensorflow.keras.preprocessing.image import ImageDataGenerator, img_to_array, load_img
+from tensorflow.keras.preprocessing.image import ImageDataGenerator
 import numpy as np
+from image_cache import load_image_array
 
 def augment_plastic_images():
     """
@@ -49,8 +50,7 @@ def augment_plastic_images():
     for img_file in image_files:
         try:
             img_path = os.path.join(input_dir, img_file)
-            img = load_img(img_path, target_size=(224, 224))
-            x = img_to_array(img)
+            x = load_image_array(img_path, (224, 224)).astype(np.float32)
             x = np.expand_dims(x, axis=0)
             
             # Generate 5 augmented images per original
@@ -0,0 +1,177 @@
+import os
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+MANIFEST_VERSION = 1
+VALIDATION_FRACTION = 0.2
+SUBSETS = ('training', 'validation')
+
+def split_of(rel_path, validation_fraction=VALIDATION_FRACTION):
+    """
+    Deterministically assign an image to 'training' or 'validation' from a hash of its relative path.
+
+    The assignment depends only on the path, so it is identical across scripts and reruns and
+    existing images keep their subset when new images are added.
+    """
+    digest = hashlib.sha1(rel_path.encode('utf-8')).digest()
+    bucket = int.from_bytes(digest[:8], 'big') / 2**64
+    return 'validation' if bucket < validation_fraction else 'training'
+
+def file_digest(path):
+    """
+    Return the SHA-1 hex digest of a file's contents.
+    """
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def _scan_class_dir(dataset_dir, cat, prev_entries):
+    """
+    List the images of one class directory with a single os.scandir pass.
+
+    The content digest of an image is carried over from prev_entries when its size and mtime are unchanged.
+    """
+    entries = {}
+    with os.scandir(os.path.join(dataset_dir, cat)) as it:
+        for entry in it:
+            if not entry.name.lower().endswith(IMAGE_EXTENSIONS) or not entry.is_file():
+                continue
+            st = entry.stat()
+            rel_path = f"{cat}/{entry.name}"
+            entries[rel_path] = {"class": cat, "size": st.st_size, "mtime": st.st_mtime,
+                                 "split": split_of(rel_path)}
+            prev = prev_entries.get(rel_path)
+            if prev and "sha1" in prev and prev["size"] == st.st_size and prev["mtime"] == st.st_mtime:
+                entries[rel_path]["sha1"] = prev["sha1"]
+    return entries
+
+def scan_dataset(dataset_dir, previous=None, workers=8, with_digests=False):
+    """
+    Scan dataset/<class>/ and return (entries, dirs).
+
+    entries maps relative_path -> {"class", "size", "mtime", "split"} and dirs maps class -> directory mtime.
+    If a previous manifest is given, class directories whose mtime is unchanged are reused from it
+    instead of being listed again. Class directories are listed in parallel.
+
+    Known content digests ("sha1") are carried over for unchanged images. With with_digests=True,
+    images without one are read and hashed too; otherwise the scan only touches file metadata.
+    """
+    previous = previous or {}
+    prev_entries = previous.get("entries", {})
+    prev_dirs = previous.get("dirs", {})
+
+    dirs = {}
+    with os.scandir(dataset_dir) as it:
+        for entry in it:
+            if entry.is_dir() and not entry.name.startswith('.'):
+                dirs[entry.name] = entry.stat().st_mtime
+
+    stale = [cat for cat, mtime in dirs.items() if prev_dirs.get(cat) != mtime]
+    entries = {path: e for path, e in prev_entries.items()
+               if e["class"] in dirs and e["class"] not in stale}
+
+    if stale:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for scanned in pool.map(lambda cat: _scan_class_dir(dataset_dir, cat, prev_entries), stale):
+                entries.update(scanned)
+
+    # New or modified images, and entries from scans that did not hash
+    missing = [path for path, e in entries.items() if "sha1" not in e] if with_digests else []
+    if missing:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            digests = pool.map(lambda path: file_digest(os.path.join(dataset_dir, path)), missing)
+            for path, digest in zip(missing, digests):
+                entries[path] = {**entries[path], "sha1": digest}
+
+    return dict(sorted(entries.items())), dict(sorted(dirs.items()))
+
+def index_dataset(dataset_dir, cache_path, with_digests=False):
+    """
+    Return an up-to-date manifest of dataset_dir, refreshing only changed class directories
+    and rewriting the cached manifest at cache_path when something changed.
+
+    Directory mtimes only change when files are added, removed or renamed; run with a fresh
+    cache (delete the file) after editing images in place. with_digests=True also records each
+    image's content digest, which the image cache and the embedding index use.
+    """
+    cached = load_manifest(cache_path)
+    entries, dirs = scan_dataset(dataset_dir, cached, with_digests=with_digests)
+    if cached is None or cached.get("dirs") != dirs or cached["entries"] != entries:
+        return save_manifest(cache_path, entries, dirs=dirs)
+    return cached
+
+def class_counts(entries):
+    """
+    Count images per class from manifest entries.
+    """
+    counts = {}
+    for e in entries.values():
+        counts[e["class"]] = counts.get(e["class"], 0) + 1
+    return dict(sorted(counts.items()))
+
+def balanced_class_weights(counts, classes):
+    """
+    Return {class_index: weight} using sklearn's 'balanced' formula, n_samples / (n_classes * count),
+    computed from counts instead of a per-image label list. Classes without images get weight 1.0.
+    """
+    present = [cls for cls in classes if counts.get(cls, 0) > 0]
+    total = sum(counts[cls] for cls in present)
+    return {i: (total / (len(present) * counts[cls]) if counts.get(cls, 0) > 0 else 1.0)
+            for i, cls in enumerate(classes)}
+
+def subset_paths(entries, subset):
+    """
+    Return the sorted relative paths of entries in the given subset ('training' or 'validation').
+    """
+    if subset not in SUBSETS:
+        raise ValueError(f"Unknown subset '{subset}'. Expected one of: {', '.join(SUBSETS)}")
+    return [path for path, e in entries.items() if (e.get("split") or split_of(path)) == subset]
+
+def subset_dataframe(entries, dataset_dir, subset):
+    """
+    Build a (filename, class) DataFrame of one subset for ImageDataGenerator.flow_from_dataframe.
+    """
+    import pandas as pd
+    paths = subset_paths(entries, subset)
+    return pd.DataFrame({
+        "filename": [os.path.join(dataset_dir, p) for p in paths],
+        "class": [entries[p]["class"] for p in paths],
+    })
+
+def load_manifest(manifest_path):
+    """
+    Load a manifest written by save_manifest, or return None if there is none.
+    """
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if manifest.get("version") != MANIFEST_VERSION:
+        print(f"⚠️  Ignoring manifest with unsupported version: {manifest_path}")
+        return None
+    return manifest
+
+def save_manifest(manifest_path, entries, **extra):
+    """
+    Atomically write the manifest entries plus any extra metadata (e.g. model version).
+    """
+    manifest = {"version": MANIFEST_VERSION, **extra, "entries": entries}
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path)
+    return manifest
+
+def diff_manifest(old_entries, new_entries):
+    """
+    Return (added_or_changed, unchanged) relative paths between two scans.
+    """
+    changed, unchanged = [], []
+    for path, entry in new_entries.items():
+        old = old_entries.get(path)
+        if old is None or old["size"] != entry["size"] or old["mtime"] != entry["mtime"]:
+            changed.append(path)
+        else:
+            unchanged.append(path)
+    return changed, unchanged
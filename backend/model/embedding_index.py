@@ -0,0 +1,258 @@
+import os
+import csv
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+INDEX_VERSION = 1
+
+def embedding_model(model):
+    """
+    Wrap a trained classifier so one forward pass returns (pooled features, probabilities).
+
+    The pooled features are the output of the GlobalAveragePooling2D layer that feeds the Dense(512) head.
+    """
+    from tensorflow import keras
+    pooling = next((layer for layer in model.layers
+                    if isinstance(layer, keras.layers.GlobalAveragePooling2D)), None)
+    if pooling is None:
+        raise ValueError("Model has no GlobalAveragePooling2D layer to take embeddings from")
+    return keras.Model(inputs=model.inputs, outputs=[pooling.output, model.output])
+
+def normalize(vectors):
+    """
+    L2-normalise rows so that a dot product is the cosine similarity.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+def _kmeans(vectors, nlist, iterations=10, seed=42):
+    """
+    Spherical k-means on normalised vectors; returns (nlist, D) unit centroids.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)]
+    for _ in range(iterations):
+        assign = (vectors @ centroids.T).argmax(axis=1)
+        for i in range(nlist):
+            members = vectors[assign == i]
+            if len(members):
+                centroids[i] = members.sum(axis=0)
+        centroids = normalize(centroids)
+    return centroids
+
+class EmbeddingIndex:
+    """
+    Inverted-file approximate nearest-neighbour index over unit-norm embeddings.
+
+    Vectors are stored as float16, grouped by their nearest coarse centroid so that each
+    inverted list is a contiguous slice vectors[offsets[i]:offsets[i + 1]]. A query scans
+    only the nprobe lists whose centroids are closest to it.
+    """
+    def __init__(self, vectors, paths, labels, classes, centroids, offsets):
+        self.vectors = vectors
+        self.paths = paths
+        self.labels = labels
+        self.classes = list(classes)
+        self.centroids = centroids
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.paths)
+
+    @classmethod
+    def build(cls, vectors, paths, labels, classes, nlist=None, train_size=50000):
+        vectors = normalize(vectors)
+        if nlist is None:
+            nlist = int(np.clip(np.sqrt(len(vectors)), 1, 1024))
+        rng = np.random.default_rng(0)
+        sample = vectors[rng.choice(len(vectors), min(train_size, len(vectors)), replace=False)]
+        centroids = _kmeans(sample, min(nlist, len(sample)))
+
+        assign = np.concatenate([(chunk @ centroids.T).argmax(axis=1)
+                                 for chunk in np.array_split(vectors, max(1, len(vectors) // 8192))])
+        order = np.argsort(assign, kind='stable')
+        offsets = np.searchsorted(assign[order], np.arange(len(centroids) + 1))
+        return cls(vectors[order].astype(np.float16), np.asarray(paths)[order],
+                   np.asarray(labels, dtype=np.int16)[order], classes, centroids, offsets)
+
+    def search(self, query, k=5, nprobe=8, exclude=None):
+        """
+        Return up to k (path, class, similarity) tuples for the nearest indexed embeddings.
+        """
+        q = normalize(query)
+        lists = np.argsort(self.centroids @ q)[::-1][:nprobe]
+        candidates = np.concatenate([np.arange(self.offsets[i], self.offsets[i + 1]) for i in lists])
+        if exclude is not None:
+            candidates = candidates[self.paths[candidates] != exclude]
+        if len(candidates) == 0:
+            return []
+        sims = self.vectors[candidates].astype(np.float32) @ q
+        top = np.argpartition(-sims, min(k, len(sims)) - 1)[:k]
+        top = top[np.argsort(-sims[top])]
+        return [(str(self.paths[candidates[i]]), self.classes[self.labels[candidates[i]]], float(sims[i]))
+                for i in top]
+
+    def save(self, path):
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, version=INDEX_VERSION, vectors=self.vectors, paths=self.paths,
+                 labels=self.labels, classes=np.asarray(self.classes),
+                 centroids=self.centroids, offsets=self.offsets)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            if int(data['version']) != INDEX_VERSION:
+                raise ValueError(f"Unsupported embedding index version in {path}")
+            return cls(data['vectors'], data['paths'], data['labels'], data['classes'].tolist(),
+                       data['centroids'], data['offsets'])
+
+def _load_shards(shard_dir, model_digest):
+    """
+    Return (paths, digests, vectors) from the shards embedded by the model with model_digest.
+
+    Shards written by another model, or before shards recorded it, are deleted: their vectors
+    live in a different embedding space and must be recomputed.
+    """
+    paths, digests, vectors = [], [], []
+    for f in sorted(os.listdir(shard_dir)):
+        if f.startswith('shard-') and f.endswith('.npz'):
+            shard_path = os.path.join(shard_dir, f)
+            with np.load(shard_path) as shard:
+                current = 'model_digest' in shard and str(shard['model_digest']) == model_digest
+                if current:
+                    paths.extend(shard['paths'].tolist())
+                    digests.extend(shard['digests'].tolist())
+                    vectors.append(shard['vectors'])
+            if not current:
+                os.remove(shard_path)
+    return paths, digests, vectors
+
+def build_embedding_index(batch_size=64, shard_size=2048, workers=8):
+    """
+    Embed every dataset image in batches and build embedding_index.npz.
+
+    Embeddings are written to embedding_shards/ as they are computed, so an interrupted
+    run resumes from the last completed shard. Shards record the model file's digest and each
+    image's content digest, so a new model re-embeds everything and replaced images are re-embedded.
+    """
+    from tensorflow import keras
+    from dataset_manifest import index_dataset, file_digest
+    from image_cache import load_image_array, register_digests
+    from preprocessing import IMG_SIZE
+
+    # Paths
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    dataset_dir = os.path.join(base_dir, '../../dataset')
+    model_path = os.path.join(base_dir, 'waste_model_improved.h5')
+    index_path = os.path.join(base_dir, 'dataset_index.json')
+    shard_dir = os.path.join(base_dir, 'embedding_shards')
+    output_path = os.path.join(base_dir, 'embedding_index.npz')
+    os.makedirs(shard_dir, exist_ok=True)
+
+    try:
+        model = embedding_model(keras.models.load_model(model_path))
+        print("✅ Model loaded successfully!")
+    except Exception as e:
+        print(f"❌ Error loading model: {e}")
+        return
+
+    # Shards are keyed on content digests, so hash images even with IMAGE_CACHE=0
+    manifest = index_dataset(dataset_dir, index_path, with_digests=True)
+    register_digests(manifest, dataset_dir)
+    entries = manifest["entries"]
+    classes = list(manifest["dirs"])
+
+    model_digest = file_digest(model_path)
+    done_paths, done_digests, _ = _load_shards(shard_dir, model_digest)
+    done = set(zip(done_paths, done_digests))
+    todo = [p for p, e in entries.items() if (p, e["sha1"]) not in done]
+    print(f"🔍 {len(entries)} images, {len(done)} already embedded, {len(todo)} to go")
+
+    def load(rel_path):
+        # Bicubic to match the API's PIL resize
+        array = load_image_array(os.path.join(dataset_dir, rel_path), IMG_SIZE, resample='bicubic')
+        return array.astype(np.float32) / 255.0
+
+    shard_no = max([int(f[len('shard-'):-len('.npz')]) for f in os.listdir(shard_dir)
+                    if f.startswith('shard-') and f.endswith('.npz')], default=-1) + 1
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for shard_start in range(0, len(todo), shard_size):
+            shard_paths = todo[shard_start:shard_start + shard_size]
+            kept, vectors = [], []
+            for i in range(0, len(shard_paths), batch_size):
+                batch = shard_paths[i:i + batch_size]
+                arrays = []
+                for rel_path, future in zip(batch, [pool.submit(load, p) for p in batch]):
+                    try:
+                        arrays.append(future.result())
+                        kept.append(rel_path)
+                    except Exception as e:
+                        print(f"   Error processing {rel_path}: {e}")
+                if arrays:
+                    features, _ = model.predict_on_batch(np.stack(arrays))
+                    vectors.append(normalize(features).astype(np.float16))
+            if kept:
+                tmp_path = os.path.join(shard_dir, f'.shard-{shard_no:05d}.tmp.npz')
+                np.savez(tmp_path, paths=np.asarray(kept), vectors=np.concatenate(vectors),
+                         digests=np.asarray([entries[p]["sha1"] for p in kept]), model_digest=model_digest)
+                os.replace(tmp_path, os.path.join(shard_dir, f'shard-{shard_no:05d}.npz'))
+                shard_no += 1
+            done_now = shard_start + len(shard_paths)
+            print(f"Embedded {done_now}/{len(todo)} images - {done_now / (time.time() - start):.1f} images/sec")
+
+    # Build the index from shards, dropping images that were removed from the dataset or replaced
+    paths, digests, vectors = _load_shards(shard_dir, model_digest)
+    if not paths:
+        print("No embeddings to index!")
+        return
+    vectors = np.concatenate(vectors)
+    keep = np.array([p in entries and entries[p]["sha1"] == d for p, d in zip(paths, digests)])
+    paths = np.asarray(paths)[keep]
+    labels = [classes.index(entries[p]["class"]) for p in paths]
+    index = EmbeddingIndex.build(vectors[keep], paths, labels, classes)
+    index.save(output_path)
+    print(f"💾 Embedding index with {len(index)} images saved to {output_path}")
+
+def find_suspect_labels(k=10, min_agreement=0.7):
+    """
+    Flag dataset images whose nearest neighbours mostly carry a different label.
+    """
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    index = EmbeddingIndex.load(os.path.join(base_dir, 'embedding_index.npz'))
+    report_path = os.path.join(base_dir, 'suspect_labels.csv')
+
+    suspects = []
+    for i in range(len(index)):
+        path, label = str(index.paths[i]), index.classes[index.labels[i]]
+        neighbours = index.search(index.vectors[i], k=k, exclude=path)
+        if not neighbours:
+            continue
+        votes = {}
+        for _, cls, _ in neighbours:
+            votes[cls] = votes.get(cls, 0) + 1
+        majority, count = max(votes.items(), key=lambda item: item[1])
+        if majority != label and count / len(neighbours) >= min_agreement:
+            suspects.append((path, label, majority, count / len(neighbours)))
+
+    with open(report_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['path', 'label', 'neighbour_label', 'agreement'])
+        writer.writerows(suspects)
+    print(f"🔍 {len(suspects)} of {len(index)} images look mislabelled")
+    print(f"📦 Report saved to {report_path}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the embedding index or look for mislabelled dataset images.")
+    parser.add_argument('--find-mislabels', action='store_true',
+                        help="Report images whose neighbours disagree with their label instead of building")
+    parser.add_argument('--batch-size', type=int, default=64)
+    args = parser.parse_args()
+    if args.find_mislabels:
+        find_suspect_labels()
+    else:
+        build_embedding_index(args.batch_size)
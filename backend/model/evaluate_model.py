@@ -3,6 +3,8 @@ import numpy as np
 from tensorflow import keras
 from tensorflow.keras.preprocessing.image import ImageDataGenerator
 from sklearn.metrics import classification_report, confusion_matrix
+from dataset_manifest import index_dataset, subset_dataframe
+from image_cache import flow_from_dataframe, register_digests, CACHE_ENABLED
 import matplotlib.pyplot as plt
 import seaborn as sns
 
@@ -15,6 +17,7 @@ def evaluate_waste_model():
     base_dir = os.path.dirname(os.path.abspath(__file__))
     dataset_dir = os.path.join(base_dir, '../../dataset')
     model_path = os.path.join(base_dir, 'waste_model.h5')
+    index_path = os.path.join(base_dir, 'dataset_index.json')
     
     # Load the trained model
     try:
@@ -28,15 +31,18 @@ def evaluate_waste_model():
     img_size = (224, 224)
     batch_size = 32
     
-    # Create test data generator (using validation split as test)
+    # Create test data generator over the held-out validation split only
     test_datagen = ImageDataGenerator(rescale=1./255)
     
     try:
-        test_gen = test_datagen.flow_from_directory(
-            dataset_dir,
+        index = index_dataset(dataset_dir, index_path, with_digests=CACHE_ENABLED)
+        register_digests(index, dataset_dir)
+        test_gen = flow_from_dataframe(
+            test_datagen,
+            subset_dataframe(index["entries"], dataset_dir, 'validation'),
+            classes=list(index["dirs"]),
             target_size=img_size,
             batch_size=batch_size,
-            class_mode='categorical',
             shuffle=False
         )
         
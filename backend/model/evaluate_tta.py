@@ -0,0 +1,128 @@
+import os
+import json
+import time
+import argparse
+import numpy as np
+from PIL import Image
+from tensorflow import keras
+from dataset_manifest import index_dataset, subset_paths
+from preprocessing import to_model_input, tta_views, aggregate_tta, is_borderline
+
+def evaluate_tta(k=4, margin=0.15, threshold=0.7, limit=None):
+    """
+    Compare single-view, always-TTA and auto-TTA predictions on the held-out validation split,
+    reporting accuracy and per-image latency for each mode.
+    """
+
+    # Paths
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    dataset_dir = os.path.join(base_dir, '../../dataset')
+    model_path = os.path.join(base_dir, 'waste_model_improved.h5')
+    index_path = os.path.join(base_dir, 'dataset_index.json')
+    report_path = os.path.join(base_dir, 'tta_report.json')
+
+    # Load the model
+    try:
+        model = keras.models.load_model(model_path)
+        print("✅ Model loaded successfully!")
+    except Exception as e:
+        print(f"❌ Error loading model: {e}")
+        return
+
+    index = index_dataset(dataset_dir, index_path)
+    categories = list(index["dirs"])
+    paths = subset_paths(index["entries"], 'validation')[:limit]
+    print(f"✅ Validation images: {len(paths)}")
+    print(f"🔁 TTA views: {k}, margin: {margin}, threshold: {threshold}")
+
+    correct = {'single': 0, 'always': 0, 'auto': 0}
+    latency = {'single': [], 'always': [], 'auto': []}
+    triggered = 0
+    borderline_single = borderline_auto = 0
+
+    for n, rel_path in enumerate(paths, 1):
+        try:
+            image = Image.open(os.path.join(dataset_dir, rel_path)).convert('RGB')
+        except Exception as e:
+            print(f"   Error processing {rel_path}: {e}")
+            continue
+        label = categories.index(index["entries"][rel_path]["class"])
+
+        # Single view
+        start = time.perf_counter()
+        single = model.predict(np.expand_dims(to_model_input(image), axis=0), verbose=0)[0]
+        latency['single'].append(time.perf_counter() - start)
+
+        # All views in one batch
+        start = time.perf_counter()
+        always = aggregate_tta(model.predict(tta_views(image, k), verbose=0))
+        latency['always'].append(time.perf_counter() - start)
+
+        # Auto: single view, plus the extra views only for borderline confidences (same rule as /predict)
+        auto = single
+        auto_time = latency['single'][-1]
+        if is_borderline(single.max(), threshold, margin):
+            triggered += 1
+            borderline_single += int(single.argmax() == label)
+            start = time.perf_counter()
+            extra = model.predict(tta_views(image, k, skip_identity=True), verbose=0)
+            auto = aggregate_tta(np.vstack([single[np.newaxis], extra]))
+            auto_time += time.perf_counter() - start
+            borderline_auto += int(auto.argmax() == label)
+        latency['auto'].append(auto_time)
+
+        correct['single'] += int(single.argmax() == label)
+        correct['always'] += int(always.argmax() == label)
+        correct['auto'] += int(auto.argmax() == label)
+
+        if n % 100 == 0:
+            print(f"Processed {n}/{len(paths)} images...")
+
+    total = len(latency['single'])
+    borderline_total = triggered
+    if total == 0:
+        print("No images evaluated!")
+        return
+
+    report = {
+        "images": total,
+        "k": k,
+        "margin": margin,
+        "threshold": threshold,
+        "auto_trigger_rate": triggered / total,
+        "modes": {
+            mode: {
+                "accuracy": correct[mode] / total,
+                "mean_latency_ms": float(np.mean(latency[mode]) * 1000),
+                "p95_latency_ms": float(np.percentile(latency[mode], 95) * 1000),
+            }
+            for mode in correct
+        },
+        "borderline": {
+            "images": borderline_total,
+            "single_accuracy": borderline_single / borderline_total if borderline_total else None,
+            "auto_accuracy": borderline_auto / borderline_total if borderline_total else None,
+        },
+    }
+
+    print(f"\n📊 TTA Evaluation:")
+    for mode, stats in report["modes"].items():
+        print(f"   {mode:>6}: accuracy {stats['accuracy']:.4f}, "
+              f"latency {stats['mean_latency_ms']:.1f} ms (p95 {stats['p95_latency_ms']:.1f} ms)")
+    print(f"   auto TTA triggered on {triggered}/{total} images ({report['auto_trigger_rate']*100:.1f}%)")
+    if borderline_total:
+        print(f"   borderline images ({borderline_total}): single {report['borderline']['single_accuracy']:.4f} "
+              f"→ auto {report['borderline']['auto_accuracy']:.4f}")
+
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"📦 Report saved to {report_path}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the accuracy gain and latency cost of test-time augmentation.")
+    parser.add_argument('--k', type=int, default=4, help="Number of TTA views")
+    parser.add_argument('--margin', type=float, default=0.15)
+    parser.add_argument('--threshold', type=float, default=0.7)
+    parser.add_argument('--limit', type=int, default=None, help="Evaluate at most this many images")
+    args = parser.parse_args()
+    evaluate_tta(args.k, args.margin, args.threshold, args.limit)
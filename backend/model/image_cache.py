@@ -0,0 +1,204 @@
+import os
+import math
+import threading
+import numpy as np
+from PIL import Image
+from tensorflow import keras
+from dataset_manifest import file_digest
+
+# Set IMAGE_CACHE=0 to decode every image from scratch
+CACHE_ENABLED = os.environ.get('IMAGE_CACHE', '1') != '0'
+DEFAULT_CACHE_DIR = os.environ.get(
+    'IMAGE_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'image_cache'))
+DEFAULT_MAX_MB = int(os.environ.get('IMAGE_CACHE_MAX_MB', 4096))
+
+# keras load_img defaults to nearest; the API (PIL resize) uses bicubic
+RESAMPLE = {'nearest': Image.NEAREST, 'bilinear': Image.BILINEAR, 'bicubic': Image.BICUBIC}
+
+def _decode(path, size, resample):
+    # size is (height, width) like keras target_size; PIL's resize takes (width, height)
+    with Image.open(path) as image:
+        return np.asarray(image.convert('RGB').resize((size[1], size[0]), RESAMPLE[resample]), dtype=np.uint8)
+
+class ImageCache:
+    """
+    Persistent, size-bounded on-disk cache of decoded and resized RGB images as uint8 .npy files.
+
+    Entries are keyed by the SHA-1 of the file contents plus the target size and resampling
+    filter, so renamed or copied images still hit and edited images miss. Each hit refreshes
+    the entry's mtime, and when the cache grows beyond max_bytes the least recently used
+    entries are deleted.
+    """
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_mb=DEFAULT_MAX_MB):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_mb * 2**20
+        self.total_bytes = None
+        self.digests = {}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _digest(self, path):
+        st = os.stat(path)
+        memo_key = (os.path.abspath(path), st.st_size, st.st_mtime)
+        digest = self.digests.get(memo_key)
+        if digest is None:
+            digest = file_digest(path)
+            self.digests[memo_key] = digest
+        return digest
+
+    def add_digests(self, entries, dataset_dir):
+        """
+        Seed the digest memo from dataset manifest entries so images are not read just to hash them.
+
+        Seeded digests are keyed by size and mtime as well, so an image edited since the scan is re-hashed.
+        """
+        for rel_path, e in entries.items():
+            if "sha1" in e:
+                memo_key = (os.path.abspath(os.path.join(dataset_dir, rel_path)), e["size"], e["mtime"])
+                self.digests[memo_key] = e["sha1"]
+
+    def _entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for f in files:
+                if f.endswith('.npy'):
+                    yield os.path.join(root, f)
+
+    def load(self, path, size=(224, 224), resample='nearest'):
+        """
+        Return the image at path as a (H, W, 3) uint8 array resized to size (height, width),
+        decoding it only on a miss.
+        """
+        key = f"{self._digest(path)}-{size[0]}x{size[1]}-{resample}"
+        entry = os.path.join(self.cache_dir, key[:2], key + '.npy')
+        try:
+            array = np.load(entry)
+            os.utime(entry)
+            return array
+        except (OSError, ValueError):
+            pass
+
+        array = _decode(path, size, resample)
+
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        tmp_path = f"{entry}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, array)
+        os.replace(tmp_path, entry)
+        self._account(os.path.getsize(entry))
+        return array
+
+    def _account(self, added):
+        if self.total_bytes is None:
+            self.total_bytes = sum(os.path.getsize(p) for p in self._entries())
+        else:
+            self.total_bytes += added
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def evict(self, target_fraction=0.9):
+        """
+        Delete least recently used entries until the cache is below target_fraction of max_bytes.
+        """
+        entries = []
+        for p in self._entries():
+            try:
+                st = os.stat(p)
+                entries.append((st.st_mtime, st.st_size, p))
+            except FileNotFoundError:
+                continue
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for _, size, p in entries:
+            if total <= self.max_bytes * target_fraction:
+                break
+            try:
+                os.remove(p)
+                total -= size
+            except FileNotFoundError:
+                pass
+        self.total_bytes = total
+
+_default_cache = None
+
+def default_cache():
+    """
+    Return the shared ImageCache, or None when caching is disabled with IMAGE_CACHE=0.
+    """
+    global _default_cache
+    if not CACHE_ENABLED:
+        return None
+    if _default_cache is None:
+        _default_cache = ImageCache()
+    return _default_cache
+
+def register_digests(manifest, dataset_dir):
+    """
+    Seed the default cache with the content digests recorded in a dataset manifest.
+    """
+    cache = default_cache()
+    if cache is not None:
+        cache.add_digests(manifest["entries"], dataset_dir)
+
+def load_image_array(path, size=(224, 224), resample='nearest'):
+    """
+    Load an image as a (H, W, 3) uint8 array of size (height, width) through the default cache
+    when it is enabled.
+    """
+    cache = default_cache()
+    if cache is not None:
+        return cache.load(path, size, resample)
+    return _decode(path, size, resample)
+
+class CachedImageSequence(keras.utils.Sequence):
+    """
+    Drop-in replacement for ImageDataGenerator.flow_from_dataframe that reads resized images
+    from the ImageCache and applies the generator's random transforms and rescaling.
+    """
+    def __init__(self, datagen, dataframe, classes, target_size=(224, 224), batch_size=32,
+                 shuffle=True, seed=None, x_col='filename', y_col='class'):
+        super().__init__()
+        self.datagen = datagen
+        self.filenames = dataframe[x_col].tolist()
+        self.class_indices = {cls: i for i, cls in enumerate(classes)}
+        self.classes = np.array([self.class_indices[c] for c in dataframe[y_col]], dtype=np.int32)
+        self.samples = len(self.filenames)
+        self.target_size = tuple(target_size)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.rng = np.random.default_rng(seed)
+        self.index_array = np.arange(self.samples)
+        if shuffle:
+            self.rng.shuffle(self.index_array)
+
+    def __len__(self):
+        return math.ceil(self.samples / self.batch_size)
+
+    def __getitem__(self, idx):
+        batch = self.index_array[idx * self.batch_size:(idx + 1) * self.batch_size]
+        x = np.empty((len(batch), *self.target_size, 3), dtype=np.float32)
+        for j, i in enumerate(batch):
+            img = load_image_array(self.filenames[i], self.target_size).astype(np.float32)
+            img = self.datagen.random_transform(img)
+            x[j] = self.datagen.standardize(img)
+        y = np.eye(len(self.class_indices), dtype=np.float32)[self.classes[batch]]
+        return x, y
+
+    def on_epoch_end(self):
+        if self.shuffle:
+            self.rng.shuffle(self.index_array)
+
+def flow_from_dataframe(datagen, dataframe, classes, target_size=(224, 224), batch_size=32, shuffle=True):
+    """
+    Return a cached batch iterator over dataframe, or datagen.flow_from_dataframe when caching is disabled.
+    """
+    if CACHE_ENABLED:
+        return CachedImageSequence(datagen, dataframe, classes, target_size, batch_size, shuffle)
+    return datagen.flow_from_dataframe(
+        dataframe,
+        x_col='filename',
+        y_col='class',
+        classes=classes,
+        target_size=target_size,
+        batch_size=batch_size,
+        class_mode='categorical',
+        shuffle=shuffle
+    )
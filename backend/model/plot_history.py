@@ -1,8 +1,11 @@
 import os
+import json
 import pickle
 
 # Try to import matplotlib for plotting
 try:
+    import matplotlib
+    matplotlib.use('Agg')  # Render to files; no display needed
     import matplotlib.pyplot as plt
 except ImportError:
     print("matplotlib is not installed. Please install it to see plots.")
@@ -33,9 +36,48 @@ def plot_training(history1, history2):
     plt.legend()
     plt.grid(True)
     plt.tight_layout()
-    plt.show()
+
+def plot_profile(profile):
+    """
+    Plot the per-epoch performance curves written by train_improved_simple.py --profile.
+    """
+    metrics = [
+        ('mean_step_time', 'Mean Step Time (s)'),
+        ('input_load_fraction', 'Input Load (fraction of train time)'),
+        ('images_per_sec', 'Throughput (images/sec)'),
+        ('peak_memory_mb', 'Peak Memory (MB)'),
+    ]
+    labels = {'initial': 'Initial', 'fine_tune': 'Fine-tune'}
+    plt.figure(figsize=(14, 10))
+    for i, (key, title) in enumerate(metrics, 1):
+        plt.subplot(2, 2, i)
+        # Fine-tune epochs continue after the initial phase on the x axis
+        offset = 0
+        for phase in ('initial', 'fine_tune'):
+            records = profile.get(phase, [])
+            # Peak memory is None on platforms without a GPU or RSS reading
+            values = [r[key] if r[key] is not None else float('nan') for r in records]
+            plt.plot(range(offset, offset + len(records)), values,
+                     marker='o', label=labels[phase])
+            offset += len(records)
+        plt.title(title)
+        plt.xlabel('Epoch')
+        plt.legend()
+        plt.grid(True)
+    plt.tight_layout()
 
 base_dir = os.path.dirname(os.path.abspath(__file__))
 with open(os.path.join(base_dir, 'training_history.pkl'), 'rb') as f:
     histories = pickle.load(f)
 plot_training(histories['initial'], histories['fine_tune'])
+plot_path = os.path.join(base_dir, 'training_history.png')
+plt.savefig(plot_path, dpi=150, bbox_inches='tight')
+print(f"📈 Training history plot saved to: {plot_path}")
+
+profile_path = os.path.join(base_dir, 'training_profile.json')
+if os.path.exists(profile_path):
+    with open(profile_path) as f:
+        plot_profile(json.load(f))
+    plot_path = os.path.join(base_dir, 'training_profile.png')
+    plt.savefig(plot_path, dpi=150, bbox_inches='tight')
+    print(f"⏱️ Training profile plot saved to: {plot_path}")
@@ -0,0 +1,82 @@
+import numpy as np
+from PIL import ImageOps
+
+IMG_SIZE = (224, 224)
+
+# Test-time augmentation views, in the order they are added to the batch.
+# Each entry is (name, crop fraction of the shorter side or None for the full image, horizontal flip).
+TTA_VIEWS = [
+    ('identity', None, False),
+    ('hflip', None, True),
+    ('center_crop', 0.875, False),
+    ('center_crop_hflip', 0.875, True),
+    ('zoom', 0.75, False),
+    ('zoom_hflip', 0.75, True),
+]
+
+def to_model_input(image, size=IMG_SIZE):
+    """
+    Resize an RGB PIL image and rescale it to a float array in [0, 1], like the /predict endpoint.
+    """
+    return np.asarray(image.resize(size), dtype=np.float32) / 255.0
+
+def _center_crop(image, fraction):
+    w, h = image.size
+    side = int(min(w, h) * fraction)
+    left, top = (w - side) // 2, (h - side) // 2
+    return image.crop((left, top, left + side, top + side))
+
+def tta_views(image, k=4, size=IMG_SIZE, skip_identity=False):
+    """
+    Return a (k, H, W, 3) batch of flipped / cropped / zoomed views of an RGB PIL image.
+
+    With skip_identity=True the plain view is left out (k - 1 views), for callers that
+    already have its prediction.
+    """
+    if not 1 <= k <= len(TTA_VIEWS):
+        raise ValueError(f"k must be between 1 and {len(TTA_VIEWS)}, got {k}")
+    views = []
+    for name, crop, flip in TTA_VIEWS[:k]:
+        if skip_identity and name == 'identity':
+            continue
+        view = _center_crop(image, crop) if crop else image
+        if flip:
+            view = ImageOps.mirror(view)
+        views.append(to_model_input(view, size))
+    return np.stack(views)
+
+def is_borderline(confidence, threshold, margin):
+    """
+    Whether a single-view confidence is close enough to the threshold for auto TTA to run.
+
+    Shared by /predict?tta=auto and evaluate_tta.py so both augment the same images.
+    """
+    return abs(confidence - threshold) < margin
+
+def aggregate_tta(probabilities, weights=None):
+    """
+    Average a (k, n_classes) array of per-view probabilities into one row.
+    """
+    return np.average(np.asarray(probabilities, dtype=np.float64), axis=0, weights=weights)
+
+def dhash(image, hash_size=16):
+    """
+    Return a hash_size**2-bit difference hash of a PIL image as an int; near-identical
+    images (re-encoded, resized) get the same hash.
+    """
+    pixels = np.asarray(image.convert('L').resize((hash_size + 1, hash_size)), dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+def color_thumbnail(image, size=16):
+    """
+    Return a (size, size, 3) uint8 RGB thumbnail used to confirm dhash matches, since the
+    hash itself ignores colour.
+    """
+    return np.asarray(image.convert('RGB').resize((size, size)), dtype=np.uint8)
+
+def thumbnails_match(a, b, max_mean_diff=4.0):
+    """
+    Whether two colour thumbnails differ by at most max_mean_diff (0-255) per channel on average.
+    """
+    return float(np.abs(a.astype(np.int16) - b.astype(np.int16)).mean()) <= max_mean_diff
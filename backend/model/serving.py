@@ -0,0 +1,85 @@
+import os
+
+# Shared by app.py and classify_bulk.py; importing this module has no side effects.
+
+MODEL_PATH = 'backend/model/waste_model_improved.h5'
+# Next to this module, where model/embedding_index.py writes it, independent of the working directory
+EMBEDDING_INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'embedding_index.npz')
+
+# Set DOWNLOAD_TRAINING_DATA=1 to also fetch the dataset and the extra model files,
+# which the API itself does not need
+DOWNLOAD_TRAINING_DATA = os.environ.get('DOWNLOAD_TRAINING_DATA', '0') == '1'
+
+def download_artifacts(include_training_data=DOWNLOAD_TRAINING_DATA):
+    """
+    Download the served model, and optionally the dataset and extra models, if they don't exist.
+    """
+    os.makedirs("backend/model", exist_ok=True)
+
+    if not os.path.exists(MODEL_PATH):
+        import gdown
+        gdown.download("https://drive.google.com/uc?id=13adspLBtZpSoABp4VkWjBITwWvelft6x", MODEL_PATH, quiet=False)
+
+    if not include_training_data:
+        return
+
+    import gdown
+    import zipfile
+
+    # Create folders if needed
+    os.makedirs("models", exist_ok=True)
+    os.makedirs("data", exist_ok=True)
+
+    # Download files if they don’t exist
+    if not os.path.exists("models/model1.keras"):
+        gdown.download("https://drive.google.com/uc?id=1EEVdZIccpaoae4YXqufto06sVf7kgdid", "models/model1.keras", quiet=False)
+
+    if not os.path.exists("models/model2.h5"):
+        gdown.download("https://drive.google.com/uc?id=13adspLBtZpSoABp4VkWjBITwWvelft6x", "models/model2.h5", quiet=False)
+
+    if not os.path.exists("data/dataset.zip"):
+        gdown.download("https://drive.google.com/uc?id=1Ifv5aCXVo0TDHK8K8XsrF77dk7rr83p4", "data/dataset.zip", quiet=False)
+
+    # Extract dataset if not already extracted
+    if os.path.exists("data/dataset.zip") and not os.path.exists("data/dataset"):
+        with zipfile.ZipFile("data/dataset.zip", 'r') as zip_ref:
+            zip_ref.extractall("data/")
+
+class_names = ['biodegradable', 'cardboard', 'glass', 'metal', 'organic', 'paper', 'plastic', 'trash']
+
+custom_class_map = {
+    'cardboard': {
+        "tags": ['♻️ Recyclable', '🌱 Biodegradable'],
+        "description": "Cardboard is biodegradable and recyclable if clean and dry."
+    },
+    'glass': {
+        "tags": ['♻️ Recyclable'],
+        "description": "Glass is recyclable, but should be clean and unbroken."
+    },
+    'metal': {
+        "tags": ['♻️ Recyclable'],
+        "description": "Metal (like cans or foil) is recyclable when free from food or contaminants."
+    },
+    'paper': {
+        "tags": ['♻️ Recyclable', '🌱 Biodegradable'],
+        "description": "Paper is biodegradable and recyclable if not soiled."
+    },
+    'plastic': {
+        "tags": ['♻️ Recyclable', '🚯 Non-Biodegradable'],
+        "description": "Plastics are non-biodegradable. Only some types are recyclable."
+    },
+    'trash': {
+        "tags": ['🚯 Non-Recyclable'],
+        "description": "General waste (dirty, mixed, or non-recyclable items). Should go to landfill."
+    },
+    'biodegradable': {
+        "tags": ['🌱 Biodegradable', '🍃 Eco-Friendly'],
+        "description": "Biodegradable materials naturally break down and return to the earth safely."
+    },
+    'organic': {
+        "tags": ['🍎 Organic Waste', '🌱 Biodegradable'],
+        "description": "Organic waste includes food scraps and natural matter suitable for composting."
+    }
+}
+
+CONFIDENCE_THRESHOLD = 0.7  # Set your threshold here
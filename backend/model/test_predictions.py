@@ -1,8 +1,9 @@
 import os
 import numpy as np
 from tensorflow import keras
-from tensorflow.keras.preprocessing.image import load_img, img_to_array
 import random
+from dataset_manifest import index_dataset, subset_paths
+from image_cache import load_image_array, register_digests, CACHE_ENABLED
 
 def test_model_predictions():
     """
@@ -13,6 +14,7 @@ def test_model_predictions():
     base_dir = os.path.dirname(os.path.abspath(__file__))
     dataset_dir = os.path.join(base_dir, '../../dataset')
     model_path = os.path.join(base_dir, 'waste_model_improved.h5')
+    index_path = os.path.join(base_dir, 'dataset_index.json')
     
     # Load the model
     try:
@@ -26,9 +28,11 @@ def test_model_predictions():
             print(f"❌ Error loading model: {e}")
             return
     
-    # Get categories
-    categories = [d for d in os.listdir(dataset_dir) 
-                 if os.path.isdir(os.path.join(dataset_dir, d)) and not d.startswith('.')]
+    # Get categories (sorted, matching the training class indices) and held-out images
+    index = index_dataset(dataset_dir, index_path, with_digests=CACHE_ENABLED)
+    register_digests(index, dataset_dir)
+    categories = list(index["dirs"])
+    validation_paths = subset_paths(index["entries"], 'validation')
     
     print(f"📁 Testing categories: {categories}")
     
@@ -37,7 +41,7 @@ def test_model_predictions():
         print(f"\n🔍 Testing {category} category:")
         
         cat_path = os.path.join(dataset_dir, category)
-        images = [f for f in os.listdir(cat_path) if f.lower().endswith('.jpg')]
+        images = [p.split('/', 1)[1] for p in validation_paths if index["entries"][p]["class"] == category]
         
         if len(images) == 0:
             print(f"   No images found in {category}")
@@ -50,8 +54,7 @@ def test_model_predictions():
             
             try:
                 # Load and preprocess image
-                img = load_img(img_path, target_size=(224, 224))
-                img_array = img_to_array(img)
+                img_array = load_image_array(img_path, (224, 224)).astype(np.float32)
                 img_array = np.expand_dims(img_array, axis=0)
                 img_array = img_array / 255.0
                 
@@ -1,8 +1,8 @@
 import os
-import numpy as np
 from tensorflow import keras
 from tensorflow.keras.preprocessing.image import ImageDataGenerator
-from sklearn.utils.class_weight import compute_class_weight
+from dataset_manifest import index_dataset, subset_dataframe, class_counts, balanced_class_weights
+from image_cache import flow_from_dataframe, register_digests, CACHE_ENABLED
 
 def train_waste_classification_model():
     """
@@ -13,6 +13,7 @@ def train_waste_classification_model():
     base_dir = os.path.dirname(os.path.abspath(__file__))
     dataset_dir = os.path.join(base_dir, '../../dataset')
     model_path = os.path.join(base_dir, 'waste_model.keras')  # Using .keras format
+    index_path = os.path.join(base_dir, 'dataset_index.json')
     
     # Configuration
     img_size = (224, 224)
@@ -26,8 +27,10 @@ def train_waste_classification_model():
     
     # Check available categories
     try:
-        categories = [d for d in os.listdir(dataset_dir) 
-                     if os.path.isdir(os.path.join(dataset_dir, d)) and not d.startswith('.')]
+        index = index_dataset(dataset_dir, index_path, with_digests=CACHE_ENABLED)
+        register_digests(index, dataset_dir)
+        counts = class_counts(index["entries"])
+        categories = list(index["dirs"])
         print(f"Found categories: {categories}")
     except Exception as e:
         print(f"Error reading dataset directory: {e}")
@@ -40,7 +43,6 @@ def train_waste_classification_model():
     # Data generators with augmentation
     train_datagen = ImageDataGenerator(
         rescale=1./255,
-        validation_split=0.2,
         rotation_range=20,
         width_shift_range=0.2,
         height_shift_range=0.2,
@@ -51,21 +53,21 @@ def train_waste_classification_model():
     )
     
     try:
-        train_gen = train_datagen.flow_from_directory(
-            dataset_dir,
+        train_gen = flow_from_dataframe(
+            train_datagen,
+            subset_dataframe(index["entries"], dataset_dir, 'training'),
+            classes=categories,
             target_size=img_size,
             batch_size=batch_size,
-            class_mode='categorical',
-            subset='training',
             shuffle=True
         )
         
-        val_gen = train_datagen.flow_from_directory(
-            dataset_dir,
+        val_gen = flow_from_dataframe(
+            train_datagen,
+            subset_dataframe(index["entries"], dataset_dir, 'validation'),
+            classes=categories,
             target_size=img_size,
             batch_size=batch_size,
-            class_mode='categorical',
-            subset='validation',
             shuffle=True
         )
         
@@ -79,15 +81,7 @@ def train_waste_classification_model():
     # Calculate class weights
     try:
         classes = list(train_gen.class_indices.keys())
-        class_counts = {cat: len(os.listdir(os.path.join(dataset_dir, cat))) for cat in classes}
-        class_indices = {cls: idx for idx, cls in enumerate(classes)}
-        
-        y = []
-        for cls in classes:
-            y += [class_indices[cls]] * class_counts[cls]
-        
-        class_weights = compute_class_weight(class_weight='balanced', classes=np.unique(y), y=y)
-        class_weight_dict = {i: w for i, w in enumerate(class_weights)}
+        class_weight_dict = balanced_class_weights(counts, classes)
         print('Class weights:', class_weight_dict)
         
     except Exception as e:
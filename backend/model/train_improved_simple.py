@@ -1,11 +1,12 @@
 import os
-import numpy as np
 from tensorflow import keras
 from tensorflow.keras.preprocessing.image import ImageDataGenerator
 from tensorflow.keras.applications import ResNet50V2
 from tensorflow.keras.layers import Dense, GlobalAveragePooling2D, Dropout
 from tensorflow.keras.models import Model
-from sklearn.utils.class_weight import compute_class_weight
+from dataset_manifest import index_dataset, subset_dataframe, save_manifest, class_counts, balanced_class_weights
+from image_cache import flow_from_dataframe, register_digests, CACHE_ENABLED
+import argparse
 import pickle
 
 # Try to import matplotlib for plotting
@@ -46,15 +47,19 @@ def plot_training(history1, history2):
     plt.tight_layout()
     plt.show()
 
-def train_improved_waste_model():
+def train_improved_waste_model(profile=False):
     """
     Train an improved waste classification model with better architecture and data handling.
+    
+    With profile=True, per-epoch step time, input load time, images/sec and peak memory
+    for both phases are written to training_profile.json next to the history.
     """
     
     # Paths
     base_dir = os.path.dirname(os.path.abspath(__file__))
     dataset_dir = os.path.join(base_dir, '../../dataset')
     model_path = os.path.join(base_dir, 'waste_model_improved.keras')
+    index_path = os.path.join(base_dir, 'dataset_index.json')
     
     # Configuration
     img_size = (224, 224)
@@ -63,17 +68,17 @@ def train_improved_waste_model():
     
     print("🔍 Checking dataset structure...")
     
-    # Check available categories
+    # Index the dataset once; counts and class weights come from the manifest
     try:
-        categories = [d for d in os.listdir(dataset_dir) 
-                     if os.path.isdir(os.path.join(dataset_dir, d)) and not d.startswith('.')]
+        index = index_dataset(dataset_dir, index_path, with_digests=CACHE_ENABLED)
+        register_digests(index, dataset_dir)
+        counts = class_counts(index["entries"])
+        categories = list(index["dirs"])
         print(f"Found categories: {categories}")
         
         # Check image counts per category
         for cat in categories:
-            cat_path = os.path.join(dataset_dir, cat)
-            img_count = len([f for f in os.listdir(cat_path) if f.lower().endswith('.jpg')])
-            print(f"  {cat}: {img_count} images")
+            print(f"  {cat}: {counts.get(cat, 0)} images")
             
     except Exception as e:
         print(f"Error reading dataset: {e}")
@@ -82,7 +87,6 @@ def train_improved_waste_model():
     # Data generators with proper augmentation
     train_datagen = ImageDataGenerator(
         rescale=1./255,
-        validation_split=0.2,
         rotation_range=30,
         width_shift_range=0.2,
         height_shift_range=0.2,
@@ -96,26 +100,25 @@ def train_improved_waste_model():
     
     # No augmentation for validation
     val_datagen = ImageDataGenerator(
-        rescale=1./255,
-        validation_split=0.2
+        rescale=1./255
     )
     
     try:
-        train_gen = train_datagen.flow_from_directory(
-            dataset_dir,
+        train_gen = flow_from_dataframe(
+            train_datagen,
+            subset_dataframe(index["entries"], dataset_dir, 'training'),
+            classes=categories,
             target_size=img_size,
             batch_size=batch_size,
-            class_mode='categorical',
-            subset='training',
             shuffle=True
         )
         
-        val_gen = val_datagen.flow_from_directory(
-            dataset_dir,
+        val_gen = flow_from_dataframe(
+            val_datagen,
+            subset_dataframe(index["entries"], dataset_dir, 'validation'),
+            classes=categories,
             target_size=img_size,
             batch_size=batch_size,
-            class_mode='categorical',
-            subset='validation',
             shuffle=False
         )
         
@@ -130,15 +133,7 @@ def train_improved_waste_model():
     # Calculate class weights for imbalanced data
     try:
         classes = list(train_gen.class_indices.keys())
-        class_counts = {cat: len(os.listdir(os.path.join(dataset_dir, cat))) for cat in classes}
-        class_indices = {cls: idx for idx, cls in enumerate(classes)}
-        
-        y = []
-        for cls in classes:
-            y += [class_indices[cls]] * class_counts[cls]
-        
-        class_weights = compute_class_weight(class_weight='balanced', classes=np.unique(y), y=y)
-        class_weight_dict = {i: w for i, w in enumerate(class_weights)}
+        class_weight_dict = balanced_class_weights(counts, classes)
         print('Class weights:', class_weight_dict)
         
     except Exception as e:
@@ -205,15 +200,26 @@ def train_improved_waste_model():
         )
     ]
     
+    # Optional performance profiling, one record list per phase
+    profile_records = {}
+    train_data = train_gen
+    if profile:
+        from training_profiler import TimedSequence, TrainingProfiler
+        train_data = TimedSequence(train_gen)
+        initial_callbacks = callbacks + [TrainingProfiler('initial', train_data, profile_records)]
+        fine_tune_callbacks = callbacks + [TrainingProfiler('fine_tune', train_data, profile_records)]
+    else:
+        initial_callbacks = fine_tune_callbacks = callbacks
+    
     # Train the model
     try:
         print("🚀 Starting training...")
         history = model.fit(
-            train_gen,
+            train_data,
             epochs=epochs,
             validation_data=val_gen,
             class_weight=class_weight_dict,
-            callbacks=callbacks,
+            callbacks=initial_callbacks,
             verbose=1
         )
         
@@ -235,11 +241,11 @@ def train_improved_waste_model():
         
         # Fine-tune for fewer epochs
         history_fine = model.fit(
-            train_gen,
+            train_data,
             epochs=15,
             validation_data=val_gen,
             class_weight=class_weight_dict,
-            callbacks=callbacks,
+            callbacks=fine_tune_callbacks,
             verbose=1
         )
         
@@ -249,6 +255,10 @@ def train_improved_waste_model():
         with open(os.path.join(base_dir, 'training_history.pkl'), 'wb') as f:
             pickle.dump({'initial': history.history, 'fine_tune': history_fine.history}, f)
         print("📦 Training history saved to training_history.pkl")
+        if profile:
+            from training_profiler import save_profile
+            save_profile(profile_records, os.path.join(base_dir, 'training_profile.json'))
+            print("⏱️ Training profile saved to training_profile.json")
         # 📊 Plot training and validation accuracy/loss
         plot_training(history, history_fine)
         
@@ -274,6 +284,11 @@ def train_improved_waste_model():
         model.save(h5_path)
         print(f"💾 Model also saved to {h5_path}")
         
+        # Record what the model was trained on so train_incremental.py can find new images
+        manifest_path = os.path.join(base_dir, 'dataset_manifest.json')
+        save_manifest(manifest_path, index["entries"], dirs=index["dirs"], model_version='waste_model_improved')
+        print(f"📦 Dataset manifest saved to {manifest_path}")
+        
         # Print training history summary
         print(f"\n📈 Training Summary:")
         print(f"   Final Training Accuracy: {history.history['accuracy'][-1]:.4f}")
@@ -283,4 +298,8 @@ def train_improved_waste_model():
         print(f"Error during evaluation: {e}")
 
 if __name__ == "__main__":
-    train_improved_waste_model() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Train the improved waste classification model.")
+    parser.add_argument('--profile', action='store_true',
+                        help="Record per-epoch step time, input load time, images/sec and peak memory")
+    args = parser.parse_args()
+    train_improved_waste_model(profile=args.profile) 
\ No newline at end of file
@@ -0,0 +1,172 @@
+import os
+import time
+import random
+import shutil
+import argparse
+import tensorflow as tf
+from tensorflow import keras
+from dataset_manifest import index_dataset, load_manifest, save_manifest, diff_manifest, subset_paths
+
+def make_dataset(paths, labels, num_classes, img_size, batch_size, training):
+    """
+    Build a tf.data pipeline that decodes, resizes and rescales images like the training generators.
+    """
+    ds = tf.data.Dataset.from_tensor_slices((paths, labels))
+    if training:
+        ds = ds.shuffle(len(paths), seed=42, reshuffle_each_iteration=True)
+
+    def load(path, label):
+        img = tf.io.decode_image(tf.io.read_file(path), channels=3, expand_animations=False)
+        img = tf.image.resize(img, img_size) / 255.0
+        if training:
+            img = tf.image.random_flip_left_right(img)
+            img = tf.clip_by_value(tf.image.random_brightness(img, 0.2), 0.0, 1.0)
+        return img, tf.one_hot(label, num_classes)
+
+    return ds.map(load, num_parallel_calls=tf.data.AUTOTUNE).batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
+def train_incremental(epochs=3, replay_ratio=3.0, learning_rate=1e-5, promote=False):
+    """
+    Fine-tune the deployed model on images added since the last manifest, mixed with a replay sample of old images.
+
+    The manifest records what the deployed model was trained on and is only advanced when the
+    new model is promoted.
+    """
+
+    # Paths
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    dataset_dir = os.path.join(base_dir, '../../dataset')
+    deployed_path = os.path.join(base_dir, 'waste_model_improved.h5')
+    manifest_path = os.path.join(base_dir, 'dataset_manifest.json')
+    index_path = os.path.join(base_dir, 'dataset_index.json')
+
+    # Configuration
+    img_size = (224, 224)
+    batch_size = 16
+    rng = random.Random(42)
+
+    print("🔍 Scanning dataset...")
+    try:
+        index = index_dataset(dataset_dir, index_path)
+        current = index["entries"]
+        categories = list(index["dirs"])
+        print(f"Found {len(current)} images in {len(categories)} categories")
+    except Exception as e:
+        print(f"Error reading dataset: {e}")
+        return
+
+    manifest = load_manifest(manifest_path)
+    if manifest is None:
+        save_manifest(manifest_path, current, dirs=index["dirs"], model_version='waste_model_improved')
+        print(f"📦 No manifest found. Recorded current dataset as the baseline for the deployed model in {manifest_path}")
+        print("   Add new images and rerun to fine-tune on them.")
+        return
+
+    new_paths, old_paths = diff_manifest(manifest["entries"], current)
+    print(f"🆕 New or changed images: {len(new_paths)}")
+    print(f"📚 Previously seen images: {len(old_paths)}")
+    if not new_paths:
+        print("Nothing to do: no new images since the last manifest.")
+        return
+
+    # Load the deployed model
+    try:
+        model = keras.models.load_model(deployed_path)
+        print(f"✅ Loaded deployed model from {deployed_path}")
+    except Exception as e:
+        print(f"❌ Error loading model: {e}")
+        return
+
+    if model.output_shape[-1] != len(categories):
+        print(f"❌ Model has {model.output_shape[-1]} outputs but dataset has {len(categories)} classes.")
+        print("   New classes need a full retrain with train_improved_simple.py")
+        return
+
+    # Use the persisted validation split, then mix new training images with a replay sample of old ones
+    validation = set(subset_paths(current, 'validation'))
+    train_new = [p for p in new_paths if p not in validation]
+    val_new = [p for p in new_paths if p in validation]
+    train_old = [p for p in old_paths if p not in validation]
+    val_old = [p for p in old_paths if p in validation]
+
+    rng.shuffle(train_old)
+    replay = train_old[:min(len(train_old), int(len(train_new) * replay_ratio))]
+    rng.shuffle(val_old)
+    val_old = val_old[:max(len(val_new) * 4, 200)]
+
+    train_paths = train_new + replay
+    val_paths = val_new + val_old
+    print(f"✅ Training samples: {len(train_paths)} ({len(train_new)} new + {len(replay)} replay)")
+    print(f"✅ Validation samples: {len(val_paths)} ({len(val_new)} new + {len(val_old)} old)")
+
+    class_indices = {cls: idx for idx, cls in enumerate(categories)}
+
+    def to_dataset(paths, training):
+        files = [os.path.join(dataset_dir, p) for p in paths]
+        labels = [class_indices[current[p]["class"]] for p in paths]
+        return make_dataset(files, labels, len(categories), img_size, batch_size, training)
+
+    train_ds = to_dataset(train_paths, training=True)
+    val_ds = to_dataset(val_paths, training=False) if val_paths else None
+
+    model.compile(
+        optimizer=keras.optimizers.Adam(learning_rate=learning_rate),
+        loss='categorical_crossentropy',
+        metrics=['accuracy']
+    )
+
+    callbacks = []
+    if val_ds is not None:
+        callbacks.append(keras.callbacks.EarlyStopping(
+            monitor='val_accuracy',
+            patience=2,
+            restore_best_weights=True
+        ))
+
+    # Fine-tune
+    try:
+        print("🚀 Starting incremental fine-tuning...")
+        start = time.time()
+        model.fit(
+            train_ds,
+            epochs=epochs,
+            validation_data=val_ds,
+            callbacks=callbacks,
+            verbose=1
+        )
+        print(f"✅ Fine-tuning completed in {time.time() - start:.1f}s")
+    except Exception as e:
+        print(f"Error during training: {e}")
+        return
+
+    # Save a new versioned model and the manifest it was trained on
+    try:
+        version = time.strftime('waste_model_improved_v%Y%m%d_%H%M%S')
+        keras_path = os.path.join(base_dir, f'{version}.keras')
+        h5_path = os.path.join(base_dir, f'{version}.h5')
+        model.save(keras_path)
+        model.save(h5_path)
+        print(f"💾 Model saved to {keras_path} and {h5_path}")
+
+        # The manifest tracks what the deployed model has seen, so it only advances on promotion;
+        # otherwise the next run fine-tunes the deployed model on these images again
+        if promote:
+            shutil.copyfile(h5_path, deployed_path)
+            print(f"🚢 Promoted {version} to {deployed_path}")
+            save_manifest(manifest_path, current, dirs=index["dirs"], model_version=version)
+            print(f"📦 Manifest updated: {manifest_path}")
+        else:
+            print("ℹ️  Not promoted: the manifest is unchanged, rerun with --promote to deploy")
+    except Exception as e:
+        print(f"Error saving model: {e}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fine-tune the deployed waste model on newly labelled images.")
+    parser.add_argument('--epochs', type=int, default=3)
+    parser.add_argument('--replay-ratio', type=float, default=3.0,
+                        help="Old images replayed per new training image")
+    parser.add_argument('--learning-rate', type=float, default=1e-5)
+    parser.add_argument('--promote', action='store_true',
+                        help="Copy the new model over waste_model_improved.h5")
+    args = parser.parse_args()
+    train_incremental(args.epochs, args.replay_ratio, args.learning_rate, args.promote)
@@ -0,0 +1,114 @@
+import os
+import json
+import time
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+
+def _peak_memory_mb(reset=False):
+    """
+    Return (peak memory in MB, source): GPU allocator peak if a GPU is used, else process max RSS,
+    or (None, None) when neither is available.
+    """
+    if tf.config.list_physical_devices('GPU'):
+        try:
+            peak = tf.config.experimental.get_memory_info('GPU:0')['peak'] / 2**20
+            if reset:
+                tf.config.experimental.reset_memory_stats('GPU:0')
+            return peak, 'gpu'
+        except (ValueError, RuntimeError):
+            pass
+    # resource is POSIX-only; there is no RSS peak to report on Windows
+    try:
+        import resource
+    except ImportError:
+        return None, None
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / (2**20 if os.uname().sysname == 'Darwin' else 2**10), 'rss'
+
+class TimedSequence(keras.utils.Sequence):
+    """
+    Wrap a batch generator and accumulate the time spent producing batches in __getitem__.
+
+    Pass the wrapper to fit() in place of the generator so TrainingProfiler can report how much
+    of each epoch went into loading, decoding and augmenting input.
+    """
+    def __init__(self, sequence):
+        super().__init__()
+        self.sequence = sequence
+        self.samples = sequence.samples
+        self.load_time = 0.0
+
+    def __len__(self):
+        return len(self.sequence)
+
+    def __getitem__(self, idx):
+        start = time.perf_counter()
+        batch = self.sequence[idx]
+        self.load_time += time.perf_counter() - start
+        return batch
+
+    def on_epoch_end(self):
+        self.sequence.on_epoch_end()
+
+class TrainingProfiler(keras.callbacks.Callback):
+    """
+    Record per-epoch step time, input load time, throughput and peak memory for one training phase.
+
+    Input load time is read from the TimedSequence passed to fit(). With Keras' default
+    single-worker loading, batches are fetched inside the training step, so step times include it;
+    with more workers loading overlaps compute and the load time is an upper bound on input wait.
+
+    Peak memory is the GPU allocator peak for each epoch when a GPU is used. On CPU it is the
+    process max RSS, which cannot be reset, so it is the peak so far rather than per epoch
+    (recorded as peak_memory_scope "process").
+    """
+    def __init__(self, phase, timed_sequence, records):
+        super().__init__()
+        self.phase = phase
+        self.timed_sequence = timed_sequence
+        self.records = records
+
+    def on_epoch_begin(self, epoch, logs=None):
+        _peak_memory_mb(reset=True)
+        self.step_times = []
+        self.timed_sequence.load_time = 0.0
+        self.epoch_start = self.last_step_end = time.perf_counter()
+
+    def on_train_batch_begin(self, batch, logs=None):
+        self.step_start = time.perf_counter()
+
+    def on_train_batch_end(self, batch, logs=None):
+        self.last_step_end = time.perf_counter()
+        self.step_times.append(self.last_step_end - self.step_start)
+
+    def on_epoch_end(self, epoch, logs=None):
+        # Includes validation, which runs after the last training step
+        epoch_time = time.perf_counter() - self.epoch_start
+        train_time = self.last_step_end - self.epoch_start
+        load_time = self.timed_sequence.load_time
+        steps = len(self.step_times)
+        peak, source = _peak_memory_mb()
+        self.records.setdefault(self.phase, []).append({
+            "epoch": epoch,
+            "steps": steps,
+            "epoch_time": epoch_time,
+            "validation_time": epoch_time - train_time,
+            "mean_step_time": float(np.mean(self.step_times)) if steps else 0.0,
+            "p95_step_time": float(np.percentile(self.step_times, 95)) if steps else 0.0,
+            "input_load_time": load_time,
+            "input_load_fraction": load_time / train_time if train_time > 0 else 0.0,
+            # samples rather than steps * batch_size, which over-counts the partial last batch
+            "images_per_sec": self.timed_sequence.samples / train_time if train_time > 0 else 0.0,
+            "peak_memory_mb": peak,
+            "memory_source": source,
+            "peak_memory_scope": {'gpu': 'epoch', 'rss': 'process'}.get(source),
+        })
+
+def save_profile(records, path):
+    """
+    Write the collected per-phase records as JSON.
+    """
+    with open(path, 'w') as f:
+        json.dump(records, f, indent=2)